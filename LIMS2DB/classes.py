@@ -22,6 +22,19 @@ import LIMS2DB.objectsDB.process_categories as pc_cg
 from LIMS2DB.diff import diff_objects
 from LIMS2DB.utils import send_mail
 
+# Comma-joined typeid lists for the SQL IN clauses below; they are
+# constant for the lifetime of the process, so build them once instead
+# of once per sample or artifact
+AGRINITQC_TYPEIDS = ",".join(pc_cg.AGRINITQC.keys())
+AGRLIBVAL_TYPEIDS = ",".join(pc_cg.AGRLIBVAL.keys())
+CALIPER_TYPEIDS = ",".join(pc_cg.CALIPER.keys())
+FRAGMENT_ANALYZER_TYPEIDS = ",".join(pc_cg.FRAGMENT_ANALYZER.keys())
+INITIALQC_TYPEIDS = ",".join(list(pc_cg.INITALQC.keys()) + list(pc_cg.INITALQCFINISHEDLIB.keys()))
+LIBVAL_TYPEIDS = ",".join(pc_cg.LIBVAL.keys())
+PREPREPSTART_TYPEIDS = ",".join(pc_cg.PREPREPSTART.keys())
+SEQUENCING_TYPEIDS = ",".join(pc_cg.SEQUENCING.keys())
+WORKSET_START_TYPEIDS = ",".join(list(pc_cg.WORKSET.keys()) + list(pc_cg.PREPSTARTFINLIB.keys()))
+
 
 class Workset_SQL:
     def __init__(self, session, log, step):
@@ -30,6 +43,8 @@ class Workset_SQL:
         self.name = set()
         self.session = session
         self.obj = {}
+        # barcode names repeat across samples, look each one up only once
+        self._barcode_cache = {}
         self.build()
 
     def extract_barcode(self, chain):
@@ -51,10 +66,15 @@ class Workset_SQL:
                 barcode = matches.group(1)
         matches = bcp.match(barcode)
         if not matches:
+            name = barcode
+            cached = self._barcode_cache.get(name)
+            if cached is not None:
+                return cached
             meta = self.session.query(ReagentType.meta_data).filter(ReagentType.name.like(f"%{barcode}%")).scalar()
             matches = bcp.search(meta)
             if matches:
                 barcode = matches.group(0)
+            self._barcode_cache[name] = barcode
         return barcode
 
     def build(self):
@@ -101,13 +121,15 @@ class Workset_SQL:
                 sequencing_setup = ""
             else:
                 project_luid = project.luid
-                application = project.udf_dict.get("Application")
+                # udf_dict rebuilds its dict on every access, walk it once
+                project_udfs = project.udf_dict
+                application = project_udfs.get("Application")
                 name = project.name
-                library = project.udf_dict.get("Library construction method")
-                library_option = project.udf_dict.get("Library prep option")
+                library = project_udfs.get("Library construction method")
+                library_option = project_udfs.get("Library prep option")
                 sequencing_setup = "{} {}".format(
-                    project.udf_dict.get("Sequencing platform"),
-                    project.udf_dict.get("Sequencing setup"),
+                    project_udfs.get("Sequencing platform"),
+                    project_udfs.get("Sequencing setup"),
                 )
                 if project.closedate:
                     close_date = project.closedate.strftime("%Y-%m-%d")
@@ -156,13 +178,10 @@ class Workset_SQL:
 
                 self.obj["projects"][project_luid]["samples"][sample_name]["location"] = out.containerplacement.api_string
 
-                query = "select pc.* from process pc \
+                query = f"select pc.* from process pc \
                         inner join processiotracker piot on piot.processid=pc.processid \
                         inner join artifact_ancestor_map aam on aam.artifactid=piot.inputartifactid \
-                        where pc.typeid in ({agr_qc}) and aam.ancestorartifactid={out_art} order by daterun;".format(
-                    agr_qc=",".join(list(pc_cg.AGRLIBVAL.keys())),
-                    out_art=out.artifactid,
-                )
+                        where pc.typeid in ({AGRLIBVAL_TYPEIDS}) and aam.ancestorartifactid={out.artifactid} order by daterun;"
 
                 aggregates = self.session.query(Process).from_statement(text(query)).all()
 
@@ -171,9 +190,11 @@ class Workset_SQL:
                     self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["id"] = agr.luid
                     self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["name"] = agr.protocolnameused
                     if agr.daterun is not None:
-                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["date"] = agr.daterun.strftime("%Y-%m-%d")
-                        if not self.obj["last_aggregate"] or datetime.strptime(self.obj["last_aggregate"], "%Y-%m-%d") < agr.daterun:
-                            self.obj["last_aggregate"] = agr.daterun.strftime("%Y-%m-%d")
+                        # %Y-%m-%d strings compare like the dates they encode
+                        date_run = agr.daterun.strftime("%Y-%m-%d")
+                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["date"] = date_run
+                        if not self.obj["last_aggregate"] or self.obj["last_aggregate"] < date_run:
+                            self.obj["last_aggregate"] = date_run
                     else:
                         self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["date"] = None
 
@@ -183,37 +204,38 @@ class Workset_SQL:
                             where piot.processid={agr.processid} and aam.ancestorartifactid={out.artifactid};"
 
                     agr_inp = self.session.query(Artifact).from_statement(text(query)).one()
+                    # udf_dict rebuilds its dict on every property access, walk it once
+                    agr_inp_udfs = agr_inp.udf_dict
                     if agr.typeid == 806 and agr_inp.qc_flag == "UNKNOWN":
-                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["status"] = agr_inp.udf_dict.get("NeoPrep Machine QC")
-                        self.obj["projects"][project_luid]["samples"][sample_name]["library_status"] = agr_inp.udf_dict.get("NeoPrep Machine QC")
+                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["status"] = agr_inp_udfs.get("NeoPrep Machine QC")
+                        self.obj["projects"][project_luid]["samples"][sample_name]["library_status"] = agr_inp_udfs.get("NeoPrep Machine QC")
                     else:
                         self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["status"] = agr_inp.qc_flag
                         self.obj["projects"][project_luid]["samples"][sample_name]["library_status"] = agr_inp.qc_flag
                     self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["art"] = agr_inp.luid
-                    if "Molar Conc. (nM)" in agr_inp.udf_dict:
-                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["concentration"] = f"{agr_inp.udf_dict['Molar Conc. (nM)']:.2f} nM"
-                    elif "Concentration" in agr_inp.udf_dict and "Conc. Units" in agr_inp.udf_dict:
+                    if "Molar Conc. (nM)" in agr_inp_udfs:
+                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["concentration"] = f"{agr_inp_udfs['Molar Conc. (nM)']:.2f} nM"
+                    elif "Concentration" in agr_inp_udfs and "Conc. Units" in agr_inp_udfs:
                         self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["concentration"] = "{:.2f} {}".format(
-                            agr_inp.udf_dict["Concentration"],
-                            agr_inp.udf_dict["Conc. Units"],
+                            agr_inp_udfs["Concentration"],
+                            agr_inp_udfs["Conc. Units"],
                         )
-                    if "Size (bp)" in agr_inp.udf_dict:
-                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["size"] = round(agr_inp.udf_dict["Size (bp)"], 2)
+                    if "Size (bp)" in agr_inp_udfs:
+                        self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["size"] = round(agr_inp_udfs["Size (bp)"], 2)
 
                     # Fetch index (reagent_label) information
+                    # agr_inp is the only row this query returns (.one() above), so don't run it again
                     try:
-                        artifacts = self.session.query(Artifact).from_statement(text(query)).all()
-                        for art in artifacts:
-                            if art.reagentlabels is not None and len(art.reagentlabels) == 1:
-                                # If there are more than one reagent label, then I can't guess which one is the right one : the artifact is probably a pool
-                                self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["index"] = self.extract_barcode(art.reagentlabels[0].name)
+                        if agr_inp.reagentlabels is not None and len(agr_inp.reagentlabels) == 1:
+                            # If there are more than one reagent label, then I can't guess which one is the right one : the artifact is probably a pool
+                            self.obj["projects"][project_luid]["samples"][sample_name]["library"][agr.luid]["index"] = self.extract_barcode(agr_inp.reagentlabels[0].name)
                     except AssertionError:
                         pass
 
-                query = "select pc.* from process pc \
+                query = f"select pc.* from process pc \
                         inner join processiotracker piot on piot.processid=pc.processid \
                         inner join artifact_ancestor_map aam on aam.artifactid=piot.inputartifactid \
-                        where pc.typeid in ({seq}) and aam.ancestorartifactid={out_art} order by daterun;".format(seq=",".join(list(pc_cg.SEQUENCING.keys())), out_art=out.artifactid)
+                        where pc.typeid in ({SEQUENCING_TYPEIDS}) and aam.ancestorartifactid={out.artifactid} order by daterun;"
 
                 sequencing = self.session.query(Process).from_statement(text(query)).all()
                 for seq in sequencing:
@@ -249,6 +271,8 @@ class ProjectSQL:
         self.genstat_proj_url = "https://genomics-status.scilifelab.se/project/"
         self.step_defs = {}
         self.obj = {}
+        # barcode names repeat across samples, look each one up only once
+        self._barcode_cache = {}
         self.project = self.session.query(Project).filter(Project.luid == self.pid).one()
         self.build()
 
@@ -372,27 +396,31 @@ class ProjectSQL:
                 )
 
     def get_project_level(self):
+        project = self.project
+        # udf_dict is a property that rebuilds the dict on every access,
+        # so walk the udfs once and reuse the result
+        udfs = project.udf_dict
         self.obj["entity_type"] = "project_summary"
         self.obj["source"] = "lims"
-        self.obj["project_name"] = self.project.name
-        self.obj["project_id"] = self.project.luid
-        self.obj["application"] = self.project.udf_dict.get("Application")
-        self.obj["contact"] = self.project.researcher.email
-        if self.project.opendate:
-            self.obj["open_date"] = self.project.opendate.strftime("%Y-%m-%d")
-        if self.project.closedate:
-            self.obj["close_date"] = self.project.closedate.strftime("%Y-%m-%d")
-        if self.project.udf_dict.get("Delivery type"):
-            self.obj["delivery_type"] = self.project.udf_dict.get("Delivery type")
-        if self.project.udf_dict.get("Reference genome"):
-            self.obj["reference_genome"] = self.project.udf_dict.get("Reference genome")
-        self.obj["details"] = self.make_normalized_dict(self.project.udf_dict)
+        self.obj["project_name"] = project.name
+        self.obj["project_id"] = project.luid
+        self.obj["application"] = udfs.get("Application")
+        self.obj["contact"] = project.researcher.email
+        if project.opendate:
+            self.obj["open_date"] = project.opendate.strftime("%Y-%m-%d")
+        if project.closedate:
+            self.obj["close_date"] = project.closedate.strftime("%Y-%m-%d")
+        if udfs.get("Delivery type"):
+            self.obj["delivery_type"] = udfs.get("Delivery type")
+        if udfs.get("Reference genome"):
+            self.obj["reference_genome"] = udfs.get("Reference genome")
+        self.obj["details"] = self.make_normalized_dict(udfs)
         self.obj["details"].pop("running_notes", None)
         self.obj["order_details"] = self.get_project_order()
         self.obj["affiliation"] = self.obj["order_details"].get("owner", {}).get("affiliation", "")
         lims_priority = {1: "Low", 5: "Standard", 10: "High"}  # as defined in LIMS
-        if self.project.priority:
-            self.obj["priority"] = lims_priority.get(self.project.priority, None)
+        if project.priority:
+            self.obj["priority"] = lims_priority.get(project.priority, None)
 
     def get_project_summary(self):
         # get project summaries from project
@@ -400,7 +428,7 @@ class ProjectSQL:
             inner join processiotracker piot on piot.processid=pr.processid \
             inner join artifact_sample_map asm on piot.inputartifactid=asm.artifactid \
             inner join sample sa on sa.processid=asm.processid \
-            where sa.projectid = {self.project.projectid} and pr.typeid={list(pc_cg.SUMMARY.keys())[0]} order by createddate desc;"
+            where sa.projectid = {self.project.projectid} and pr.typeid={next(iter(pc_cg.SUMMARY))} order by createddate desc;"
         try:
             pjs = self.session.query(Process).from_statement(text(query)).all()
             self.obj["project_summary"] = self.make_normalized_dict(pjs[0].udf_dict)
@@ -425,20 +453,20 @@ class ProjectSQL:
                 where esc.reviewdate is NULL and sa.projectid = {self.project.projectid};"
         escalations = self.session.query(EscalationEvent).from_statement(text(query)).all()
         if escalations:
+            # get every requester and reviewer in one query instead of two per event
+            principal_ids = {esc.ownerid for esc in escalations} | {esc.reviewerid for esc in escalations}
+            query = "select distinct pr.principalid, rs.firstname, rs.lastname \
+                    from researcher rs \
+                    inner join principals pr on pr.researcherid=rs.researcherid \
+                    where pr.principalid in ({pids});".format(pids=",".join(str(pid) for pid in principal_ids))
+            names = {row[0]: f"{row[1]} {row[2]}" for row in self.session.execute(text(query))}
             esc_list = []
             for esc in escalations:
-                # get requester and reviewer
-                query = "select distinct r.* \
-                        from researcher r \
-                        inner join principals pr on pr.researcherid=r.researcherid \
-                        where pr.principalid={requesterid};"
-                requester = self.session.query(Researcher).from_statement(text(query.format(requesterid=esc.ownerid))).all()[0]
-                reviewer = self.session.query(Researcher).from_statement(text(query.format(requesterid=esc.reviewerid))).all()[0]
                 esc_list.append(
                     [
                         str(esc.processid),
-                        f"{requester.firstname} {requester.lastname}",
-                        f"{reviewer.firstname} {reviewer.lastname}",
+                        names[esc.ownerid],
+                        names[esc.reviewerid],
                     ]
                 )
             self.obj["escalations"] = esc_list
@@ -510,8 +538,9 @@ class ProjectSQL:
         for sample in self.project.samples:
             self.obj["samples"][sample.name] = {}
             self.obj["samples"][sample.name]["scilife_name"] = sample.name
-            self.obj["samples"][sample.name]["customer_name"] = sample.udf_dict.get("Customer Name")
-            self.obj["samples"][sample.name]["details"] = self.make_normalized_dict(sample.udf_dict)
+            sample_udfs = sample.udf_dict
+            self.obj["samples"][sample.name]["customer_name"] = sample_udfs.get("Customer Name")
+            self.obj["samples"][sample.name]["details"] = self.make_normalized_dict(sample_udfs)
 
             self.get_initial_qc(sample)
             self.get_library_preps(sample)
@@ -547,15 +576,12 @@ class ProjectSQL:
         except NoResultFound:
             self.log.info(f"did not find the initial artifact of sample {sample.name}")
         # get all initial QC processes for sample
-        query = "select pr.* from process pr \
+        query = f"select pr.* from process pr \
                 inner join processiotracker piot on piot.processid=pr.processid \
                 inner join artifact_sample_map asm on piot.inputartifactid=asm.artifactid \
                 inner join sample sa on sa.processid=asm.processid \
-                where sa.processid = {sapid} and pr.typeid in ({tid}) \
-                order by pr.daterun;".format(
-            sapid=sample.processid,
-            tid=",".join(list(pc_cg.INITALQC.keys()) + list(pc_cg.INITALQCFINISHEDLIB.keys())),
-        )
+                where sa.processid = {sample.processid} and pr.typeid in ({INITIALQC_TYPEIDS}) \
+                order by pr.daterun;"
         try:
             oldest_qc = self.session.query(Process).from_statement(text(query)).first()
             if not oldest_qc:
@@ -567,22 +593,23 @@ class ProjectSQL:
                 self.obj["samples"][sample.name]["initial_qc"]["start_date"] = oldest_qc.createddate.strftime("%Y-%m-%d")
                 self.obj["samples"][sample.name]["first_initial_qc_start_date"] = oldest_qc.createddate.strftime("%Y-%m-%d")
 
-            try:
-                if oldest_qc.daterun and datetime.strptime(self.obj["first_initial_qc"], "%Y-%m-%d") > oldest_qc.daterun:
-                    self.obj["first_initial_qc"] = oldest_qc.daterun.strftime("%Y-%m-%d")
-            except KeyError:
-                try:
-                    self.obj["first_initial_qc"] = oldest_qc.daterun.strftime("%Y-%m-%d")
-                except AttributeError:
-                    self.obj["first_initial_qc"] = oldest_qc.createddate.strftime("%Y-%m-%d")
+            # dict.get keeps the common "not set yet" path exception-free,
+            # and %Y-%m-%d strings order the same as the dates they encode
+            first_initial_qc = self.obj.get("first_initial_qc")
+            if oldest_qc.daterun:
+                daterun = oldest_qc.daterun.strftime("%Y-%m-%d")
+                if first_initial_qc is None or first_initial_qc > daterun:
+                    self.obj["first_initial_qc"] = daterun
+            elif first_initial_qc is None:
+                self.obj["first_initial_qc"] = oldest_qc.createddate.strftime("%Y-%m-%d")
 
             # get aggregate from init qc for sample
-            query = "select pr.* from process pr \
+            query = f"select pr.* from process pr \
                 inner join processiotracker piot on piot.processid=pr.processid \
                 inner join artifact_sample_map asm on piot.inputartifactid=asm.artifactid \
                 inner join sample sa on sa.processid=asm.processid \
-                where sa.processid = {sapid} and pr.typeid in ({tid}) \
-                order by pr.daterun desc;".format(sapid=sample.processid, tid=",".join(list(pc_cg.AGRINITQC.keys())))
+                where sa.processid = {sample.processid} and pr.typeid in ({AGRINITQC_TYPEIDS}) \
+                order by pr.daterun desc;"
             try:
                 youngest_aggregate = self.session.query(Process).from_statement(text(query)).first()
                 try:
@@ -595,7 +622,7 @@ class ProjectSQL:
         except AttributeError:
             self.log.info(f"Did not find any initial QC for sample {sample.name}")
         # get GlsFile for output artifact of a Fragment Analyzer process where its input is the initial artifact of a given sample
-        query = "select gf.* from glsfile gf \
+        query = f"select gf.* from glsfile gf \
             inner join resultfile rf on rf.glsfileid=gf.fileid \
             inner join artifact art on rf.artifactid=art.artifactid \
             inner join outputmapping om on art.artifactid=om.outputartifactid \
@@ -604,16 +631,12 @@ class ProjectSQL:
             inner join artifact_sample_map asm on  art.artifactid=asm.artifactid \
             inner join process pr on piot.processid=pr.processid \
             inner join sample sa on sa.processid=asm.processid \
-            where sa.processid = {sapid} and pr.typeid in ({tid}) and art2.isoriginal=True and art.name like '%Fragment Analyzer%{sname}' \
-            order by pr.daterun desc;".format(
-            sapid=sample.processid,
-            tid=",".join(list(pc_cg.FRAGMENT_ANALYZER.keys())),
-            sname=sample.name,
-        )
+            where sa.processid = {sample.processid} and pr.typeid in ({FRAGMENT_ANALYZER_TYPEIDS}) and art2.isoriginal=True and art.name like '%Fragment Analyzer%{sample.name}' \
+            order by pr.daterun desc;"
         frag_an_file = self.session.query(GlsFile).from_statement(text(query)).first()
         # Special case for the OmniC Tissue and Lysate QC protocol
         if not frag_an_file:
-            query = "select gf.* from glsfile gf \
+            query = f"select gf.* from glsfile gf \
                 inner join resultfile rf on rf.glsfileid=gf.fileid \
                 inner join artifact art on rf.artifactid=art.artifactid \
                 inner join outputmapping om on art.artifactid=om.outputartifactid \
@@ -625,19 +648,15 @@ class ProjectSQL:
                 inner join processtype pt on pt.typeid=pr.typeid \
                 inner join protocolstep ps on ps.processtypeid=pt.typeid \
                 inner join labprotocol lp on lp.protocolid=ps.protocolid \
-                where sa.processid = {sapid} and art.name like '%Fragment Analyzer%{sname}' and pr.typeid in ({tid}) and lp.protocolname='Tissue and Lysate QC' \
-                order by pr.daterun desc;".format(
-                sapid=sample.processid,
-                tid=",".join(list(pc_cg.FRAGMENT_ANALYZER.keys())),
-                sname=sample.name,
-            )
+                where sa.processid = {sample.processid} and art.name like '%Fragment Analyzer%{sample.name}' and pr.typeid in ({FRAGMENT_ANALYZER_TYPEIDS}) and lp.protocolname='Tissue and Lysate QC' \
+                order by pr.daterun desc;"
             frag_an_file = self.session.query(GlsFile).from_statement(text(query)).first()
         if frag_an_file:
             self.obj["samples"][sample.name]["initial_qc"]["frag_an_image"] = f"https://{self.host}/api/v2/files/40-{frag_an_file.fileid}"
         else:
             self.log.info(f"Did not find an initial QC Fragment Analyzer for sample {sample.name}")
         # get GlsFile for output artifact of a Caliper process where its input is the initial artifact of a given sample
-        query = "select gf.* from glsfile gf \
+        query = f"select gf.* from glsfile gf \
             inner join resultfile rf on rf.glsfileid=gf.fileid \
             inner join artifact art on rf.artifactid=art.artifactid \
             inner join outputmapping om on art.artifactid=om.outputartifactid \
@@ -646,12 +665,8 @@ class ProjectSQL:
             inner join artifact_sample_map asm on  art.artifactid=asm.artifactid \
             inner join process pr on piot.processid=pr.processid \
             inner join sample sa on sa.processid=asm.processid \
-            where sa.processid = {sapid} and pr.typeid in ({tid}) and art2.isoriginal=True and art.name like '%CaliperGX%{sname}' \
-            order by pr.daterun desc;".format(
-            sapid=sample.processid,
-            tid=",".join(list(pc_cg.CALIPER.keys())),
-            sname=sample.name,
-        )
+            where sa.processid = {sample.processid} and pr.typeid in ({CALIPER_TYPEIDS}) and art2.isoriginal=True and art.name like '%CaliperGX%{sample.name}' \
+            order by pr.daterun desc;"
         caliper_file = self.session.query(GlsFile).from_statement(text(query)).first()
         if caliper_file:
             self.obj["samples"][sample.name]["initial_qc"]["caliper_image"] = f"sftp://{self.host}/home/glsftp/{caliper_file.contenturi}"
@@ -659,21 +674,20 @@ class ProjectSQL:
             self.log.info(f"Did not find an initial QC Caliper for sample {sample.name}")
 
     def get_library_preps(self, sample):
+        # Alias the deep self.obj chains once; these dicts are hammered below
+        sample_obj = self.obj["samples"][sample.name]
         # first steps are either SetupWorksetPlate or Library Pooling Finished Libraries
-        query = "select pr.* from process pr \
+        query = f"select pr.* from process pr \
                 inner join processiotracker piot on piot.processid=pr.processid \
                 inner join artifact_sample_map asm on piot.inputartifactid=asm.artifactid \
                 inner join sample sa on sa.processid=asm.processid \
-                where sa.processid = {sapid} and pr.typeid in ({tid}) \
-                order by pr.daterun;".format(
-            sapid=sample.processid,
-            tid=",".join(list(pc_cg.WORKSET.keys()) + list(pc_cg.PREPSTARTFINLIB.keys())),
-        )  # Applications Generic Process
+                where sa.processid = {sample.processid} and pr.typeid in ({WORKSET_START_TYPEIDS}) \
+                order by pr.daterun;"  # Applications Generic Process
         lp_starts = self.session.query(Process).from_statement(text(query)).all()
         prepid = 64
         for one_libprep in lp_starts:
-            if "library_prep" not in self.obj["samples"][sample.name]:
-                self.obj["samples"][sample.name]["library_prep"] = {}
+            if "library_prep" not in sample_obj:
+                sample_obj["library_prep"] = {}
 
             # get all the output  artifacts of the libprep that match our sample
             query = f"select art.* from artifact art \
@@ -687,10 +701,10 @@ class ProjectSQL:
                 prepid += 1
                 prepname = chr(prepid)
 
-                self.obj["samples"][sample.name]["library_prep"][prepname] = {}
-                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"] = {}
-                self.obj["samples"][sample.name]["library_prep"][prepname]["sequenced_fc"] = []
-                self.obj["samples"][sample.name]["library_prep"][prepname]["workset_setup"] = one_libprep.luid
+                prep_obj = sample_obj["library_prep"][prepname] = {}
+                prep_obj["library_validation"] = {}
+                prep_obj["sequenced_fc"] = []
+                prep_obj["workset_setup"] = one_libprep.luid
 
                 if str(one_libprep.typeid) in pc_cg.PREPSTARTFINLIB:
                     self.obj["isFinishedLib"] = True
@@ -703,39 +717,26 @@ class ProjectSQL:
                         pc_cg.PREPSTART,
                         sample=sample.processid,
                     )
-                    older = libp[0]
-                    for l in libp:
-                        if (not older.daterun and l.daterun) or (l.daterun and older.daterun > l.daterun):
-                            older = l
+                    if not libp:
+                        raise IndexError
+                    # undated steps sort last so the earliest run one wins
+                    older = min(libp, key=lambda pro: pro.daterun or datetime.max)
                     try:
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["prep_start_date"] = older.daterun.strftime("%Y-%m-%d")
-                        if (
-                            "first_prep_start_date" not in self.obj["samples"][sample.name]
-                            or datetime.strptime(
-                                self.obj["samples"][sample.name]["first_prep_start_date"],
-                                "%Y-%m-%d",
-                            )
-                            > older.daterun
-                        ):
-                            self.obj["samples"][sample.name]["first_prep_start_date"] = older.daterun.strftime("%Y-%m-%d")
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["prep_start_date"] = older.daterun.strftime("%Y-%m-%d")
+                        prep_start_date = older.daterun.strftime("%Y-%m-%d")
+                        prep_obj["prep_start_date"] = prep_start_date
+                        if "first_prep_start_date" not in sample_obj or sample_obj["first_prep_start_date"] > prep_start_date:
+                            sample_obj["first_prep_start_date"] = prep_start_date
                     except AttributeError:
                         # Missing date run
                         pass
                 except IndexError:
                     self.log.info(f"No libstart found for sample {sample.name}")
-                    if str(one_libprep.typeid) in list(pc_cg.WORKSET.keys()):
+                    if str(one_libprep.typeid) in pc_cg.WORKSET:
                         if one_libprep.daterun:
-                            if (
-                                "first_prep_start_date" not in self.obj["samples"][sample.name]
-                                or datetime.strptime(
-                                    self.obj["samples"][sample.name]["first_prep_start_date"],
-                                    "%Y-%m-%d",
-                                )
-                                > one_libprep.daterun
-                            ):
-                                self.obj["samples"][sample.name]["first_prep_start_date"] = one_libprep.daterun.strftime("%Y-%m-%d")
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["prep_start_date"] = one_libprep.daterun.strftime("%Y-%m-%d")
+                            prep_start_date = one_libprep.daterun.strftime("%Y-%m-%d")
+                            if "first_prep_start_date" not in sample_obj or sample_obj["first_prep_start_date"] > prep_start_date:
+                                sample_obj["first_prep_start_date"] = prep_start_date
+                            prep_obj["prep_start_date"] = prep_start_date
                 pend = get_children_processes(
                     self.session,
                     one_libprep.processid,
@@ -743,12 +744,12 @@ class ProjectSQL:
                     sample=sample.processid,
                 )
                 try:
-                    recent = pend[0]
-                    for l in pend:
-                        if (not recent.daterun and l.daterun) or (l.daterun and recent.daterun < l.daterun):
-                            recent = l
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["prep_finished_date"] = recent.daterun.strftime("%Y-%m-%d")
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["prep_id"] = recent.luid
+                    if not pend:
+                        raise IndexError
+                    # undated steps sort first so the latest run one wins
+                    recent = max(pend, key=lambda pro: pro.daterun or datetime.min)
+                    prep_obj["prep_finished_date"] = recent.daterun.strftime("%Y-%m-%d")
+                    prep_obj["prep_id"] = recent.luid
                 except (IndexError, AttributeError):
                     self.log.info(f"no prepend for sample {sample.name} prep {one_libprep.processid}")
 
@@ -797,18 +798,19 @@ class ProjectSQL:
                     # try and get seqruns for this library, this should work for most of the cases
                     # but not entirely sure if it would work for edgy cases
                     try:
-                        query = "select distinct pro.* from process pro \
+                        query = f"select distinct pro.* from process pro \
                                  inner join processiotracker piot on piot.processid = pro.processid \
                                  inner join artifact_ancestor_map aam on piot.inputartifactid = aam.artifactid \
-                                 where pro.typeid in ({seq_step_id}) and aam.ancestorartifactid = {lib_art}".format(
-                            seq_step_id=",".join(pc_cg.SEQUENCING.keys()),
-                            lib_art=inp_artifact.artifactid,
-                        )
+                                 where pro.typeid in ({SEQUENCING_TYPEIDS}) and aam.ancestorartifactid = {inp_artifact.artifactid}"
                         seq_fcs = self.session.query(Process).from_statement(text(query)).all()
+                        sequenced_fc = prep_obj["sequenced_fc"]
+                        # set membership instead of scanning the list per flowcell
+                        seen_fc = set(sequenced_fc)
                         for seq in seq_fcs:
                             seq_fc_id = seq.udf_dict.get("Run ID")
-                            if seq_fc_id and seq_fc_id not in self.obj["samples"][sample.name]["library_prep"][prepname]["sequenced_fc"]:
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["sequenced_fc"].append(seq_fc_id)
+                            if seq_fc_id and seq_fc_id not in seen_fc:
+                                seen_fc.add(seq_fc_id)
+                                sequenced_fc.append(seq_fc_id)
                     except Exception:
                         self.log.warn(f"Problem finding sequenced fc for sample {sample.name}")
                         pass
@@ -822,18 +824,18 @@ class ProjectSQL:
                             where sa.processid = {sample.processid} and art.isoriginal=True"
                         try:
                             initial_artifact = self.session.query(Artifact).from_statement(text(query)).one()
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["reagent_label"] = initial_artifact.reagentlabels[0].name
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["barcode"] = self.extract_barcode(initial_artifact.reagentlabels[0].name)
+                            prep_obj["reagent_label"] = initial_artifact.reagentlabels[0].name
+                            prep_obj["barcode"] = self.extract_barcode(initial_artifact.reagentlabels[0].name)
                         except:
                             pass
 
                     # raises AttributeError on no aggregate
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid] = {}
+                    libval_obj = prep_obj["library_validation"][agrlibval.luid] = {}
                     try:
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["finish_date"] = agrlibval.daterun.strftime("%Y-%m-%d")
+                        libval_obj["finish_date"] = agrlibval.daterun.strftime("%Y-%m-%d")
                     except AttributeError:
                         pass
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["initials"] = agrlibval.technician.researcher.initials
+                    libval_obj["initials"] = agrlibval.technician.researcher.initials
                     # get input artifact of a given process that belongs to sample and descends from one_lp_art
                     query = f"select art.* from artifact art \
                         inner join artifact_sample_map asm on  art.artifactid=asm.artifactid \
@@ -870,18 +872,18 @@ class ProjectSQL:
                                 where sa.processid = {sample.processid} and piot.processid = {agrlibval.processid}"
                             inp_artifact = self.session.query(Artifact).from_statement(text(query)).first()
 
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid].update(self.make_normalized_dict(inp_artifact.udf_dict))
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["prep_status"] = inp_artifact.qc_flag
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["prep_status"] = inp_artifact.qc_flag
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["well_location"] = inp_artifact.containerplacement.api_string
+                        libval_obj.update(self.make_normalized_dict(inp_artifact.udf_dict))
+                        libval_obj["prep_status"] = inp_artifact.qc_flag
+                        prep_obj["prep_status"] = inp_artifact.qc_flag
+                        libval_obj["well_location"] = inp_artifact.containerplacement.api_string
                         if (
                             "by user" not in self.obj["details"]["library_construction_method"].lower()
                             and "in-house" not in self.obj["details"]["library_construction_method"].lower()
                             and len(inp_artifact.reagentlabels) == 1
                         ):
                             # if finlib, these are already computed
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["reagent_label"] = inp_artifact.reagentlabels[0].name
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["barcode"] = self.extract_barcode(inp_artifact.reagentlabels[0].name)
+                            prep_obj["reagent_label"] = inp_artifact.reagentlabels[0].name
+                            prep_obj["barcode"] = self.extract_barcode(inp_artifact.reagentlabels[0].name)
                         elif (
                             "by user" not in self.obj["details"]["library_construction_method"].lower()
                             and "in-house" not in self.obj["details"]["library_construction_method"].lower()
@@ -890,27 +892,24 @@ class ProjectSQL:
                             # For cases that samples are indexed and pooled prior to Library QC
                             for iaa in inp_artifact.ancestors:
                                 if iaa.reagentlabels and len(iaa.samples) == 1 and iaa.samples[0].name == sample.name:
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["reagent_label"] = iaa.reagentlabels[0].name
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["barcode"] = self.extract_barcode(iaa.reagentlabels[0].name)
+                                    prep_obj["reagent_label"] = iaa.reagentlabels[0].name
+                                    prep_obj["barcode"] = self.extract_barcode(iaa.reagentlabels[0].name)
                         # get libval steps from the same input art
-                        query = "select pr.* from process pr \
+                        query = f"select pr.* from process pr \
                             inner join processiotracker piot on piot.processid=pr.processid \
-                            where pr.typeid in ({dem}) and piot.inputartifactid={iaid} \
-                            order by pr.daterun;".format(
-                            dem=",".join(list(pc_cg.LIBVAL.keys())),
-                            iaid=inp_artifact.artifactid,
-                        )
+                            where pr.typeid in ({LIBVAL_TYPEIDS}) and piot.inputartifactid={inp_artifact.artifactid} \
+                            order by pr.daterun;"
                         libvals = self.session.query(Process).from_statement(text(query)).all()
                         try:
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["start_date"] = libvals[0].daterun.strftime("%Y-%m-%d")
+                            libval_obj["start_date"] = libvals[0].daterun.strftime("%Y-%m-%d")
                         except IndexError:
                             self.log.info(f"no library validation steps found for sample {sample.name} prep {agrlibval.luid}")
                             try:
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["start_date"] = agrlibval.daterun.strftime("%Y-%m-%d")
+                                libval_obj["start_date"] = agrlibval.daterun.strftime("%Y-%m-%d")
                             except AttributeError:
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["start_date"] = agrlibval.createddate.strftime("%Y-%m-%d")
+                                libval_obj["start_date"] = agrlibval.createddate.strftime("%Y-%m-%d")
                         # get GlsFile for output artifact of a Fragment Analyzer process where its input is the initial artifact of a given sample
-                        query = "select gf.* from glsfile gf \
+                        query = f"select gf.* from glsfile gf \
                             inner join resultfile rf on rf.glsfileid=gf.fileid \
                             inner join artifact art on rf.artifactid=art.artifactid \
                             inner join outputmapping om on art.artifactid=om.outputartifactid \
@@ -919,18 +918,11 @@ class ProjectSQL:
                             inner join artifact_sample_map asm on  art.artifactid=asm.artifactid \
                             inner join process pr on piot.processid=pr.processid \
                             inner join sample sa on sa.processid=asm.processid \
-                            where sa.processid = {sapid} and pr.typeid in ({tid}) and art2.artifactid={inpid} and art.name like '%Fragment Analyzer%{sname}' \
-                            order by pr.daterun desc;".format(
-                            sapid=sample.processid,
-                            tid=",".join(list(pc_cg.FRAGMENT_ANALYZER.keys())),
-                            inpid=inp_artifact.artifactid,
-                            sname=sample.name,
-                        )
+                            where sa.processid = {sample.processid} and pr.typeid in ({FRAGMENT_ANALYZER_TYPEIDS}) and art2.artifactid={inp_artifact.artifactid} and art.name like '%Fragment Analyzer%{sample.name}' \
+                            order by pr.daterun desc;"
                         frag_an_file = self.session.query(GlsFile).from_statement(text(query)).first()
                         if frag_an_file:
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["frag_an_image"] = (
-                                f"https://{self.host}/api/v2/files/40-{frag_an_file.fileid}"
-                            )
+                            libval_obj["frag_an_image"] = f"https://{self.host}/api/v2/files/40-{frag_an_file.fileid}"
                         else:
                             self.log.info(f"Did not find a libprep Fragment Analyzer for sample {sample.name}")
                         # Get Ratio(%) from Fragment Analyzer QC
@@ -942,9 +934,9 @@ class ProjectSQL:
                         if frag_an_artifact:
                             frag_an_ratio = frag_an_artifact[0].udf_dict.get("Ratio (%)", "")
                             if frag_an_ratio:
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["frag_an_ratio"] = frag_an_ratio
+                                libval_obj["frag_an_ratio"] = frag_an_ratio
                         # get GlsFile for output artifact of a Caliper process where its input is given
-                        query = "select gf.* from glsfile gf \
+                        query = f"select gf.* from glsfile gf \
                             inner join resultfile rf on rf.glsfileid=gf.fileid \
                             inner join artifact art on rf.artifactid=art.artifactid \
                             inner join outputmapping om on art.artifactid=om.outputartifactid \
@@ -953,25 +945,18 @@ class ProjectSQL:
                             inner join artifact_sample_map asm on  art.artifactid=asm.artifactid \
                             inner join process pr on piot.processid=pr.processid \
                             inner join sample sa on sa.processid=asm.processid \
-                            where sa.processid = {sapid} and pr.typeid in ({tid}) and art2.artifactid={inpid} and art.name like '%CaliperGX%{sname}' \
-                            order by pr.daterun desc;".format(
-                            sapid=sample.processid,
-                            inpid=inp_artifact.artifactid,
-                            tid=",".join(list(pc_cg.CALIPER.keys())),
-                            sname=sample.name,
-                        )
+                            where sa.processid = {sample.processid} and pr.typeid in ({CALIPER_TYPEIDS}) and art2.artifactid={inp_artifact.artifactid} and art.name like '%CaliperGX%{sample.name}' \
+                            order by pr.daterun desc;"
                         try:
                             caliper_file = self.session.query(GlsFile).from_statement(text(query)).first()
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["caliper_image"] = (
-                                f"sftp://{self.host}/home/glsftp/{caliper_file.contenturi}"
-                            )
+                            libval_obj["caliper_image"] = f"sftp://{self.host}/home/glsftp/{caliper_file.contenturi}"
                         except AttributeError:
                             self.log.info(f"Did not find a libprep caliper image for sample {sample.name}")
                         # handling neoprep
                         if "NeoPrep" in agrlibval.type.displayname:
                             try:
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["concentration"] = inp_artifact.udf_dict["Normalized conc. (nM)"]
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["conc_units"] = "nM"
+                                libval_obj["concentration"] = inp_artifact.udf_dict["Normalized conc. (nM)"]
+                                libval_obj["conc_units"] = "nM"
                             except KeyError:
                                 # The first neoprep projects did not go that well and have no concentration.
                                 pass
@@ -989,18 +974,16 @@ class ProjectSQL:
                                 and piot.inputartifactid = {inp_artifact.artifactid}"
                             try:
                                 out_art = self.session.query(Artifact).from_statement(text(query)).one()
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["prep_status"] = out_art.qc_flag
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["prep_status"] = out_art.qc_flag
+                                prep_obj["prep_status"] = out_art.qc_flag
+                                libval_obj["prep_status"] = out_art.qc_flag
 
                             except NoResultFound:
                                 self.log.info(f"Did not find the output resultfile of the Neoprep step for sample {sample.name}")
                     except NoResultFound:
                         pass
                     # cleaning up
-                    if "size_(bp)" in self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]:
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["library_validation"][agrlibval.luid]["average_size_bp"] = self.obj["samples"][sample.name]["library_prep"][
-                            prepname
-                        ]["library_validation"][agrlibval.luid]["size_(bp)"]
+                    if "size_(bp)" in libval_obj:
+                        libval_obj["average_size_bp"] = libval_obj["size_(bp)"]
                 except AttributeError:
                     self.log.info(f"No aggregate for sample {sample.name} prep {one_libprep.luid}")
                 # get output analyte of a given process that belongs to sample and has one_libprep_art as ancestor
@@ -1025,38 +1008,33 @@ class ProjectSQL:
                     and art.artifacttypeid = 2"
                 try:
                     # out_artifact = self.session.query(Artifact).from_statement(text(query)).one() This is with the old query from Denis
-                    out_artifact = self.session.query(Artifact).from_statement(text(query)).all()[0]
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["workset_name"] = out_artifact.containerplacement.container.name
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["amount_taken_(ng)"] = out_artifact.udf_dict.get("Amount taken (ng)")
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["amount_for_prep_(ng)"] = out_artifact.udf_dict.get("Amount for prep (ng)")
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["amount_for_prep_(fmol)"] = out_artifact.udf_dict.get("Amount for prep (fmol)")
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["amount_taken_from_plate_(ng)"] = out_artifact.udf_dict.get("Amount taken from plate (ng)")
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["volume_(ul)"] = out_artifact.udf_dict.get("Total Volume (uL)")
+                    # first() stops after one row instead of materializing every match
+                    out_artifact = self.session.query(Artifact).from_statement(text(query)).first()
+                    if out_artifact is None:
+                        raise NoResultFound
+                    prep_obj["workset_name"] = out_artifact.containerplacement.container.name
+                    out_art_udfs = out_artifact.udf_dict
+                    prep_obj["amount_taken_(ng)"] = out_art_udfs.get("Amount taken (ng)")
+                    prep_obj["amount_for_prep_(ng)"] = out_art_udfs.get("Amount for prep (ng)")
+                    prep_obj["amount_for_prep_(fmol)"] = out_art_udfs.get("Amount for prep (fmol)")
+                    prep_obj["amount_taken_from_plate_(ng)"] = out_art_udfs.get("Amount taken from plate (ng)")
+                    prep_obj["volume_(ul)"] = out_art_udfs.get("Total Volume (uL)")
 
                 except NoResultFound:
                     self.log.info(f"Did not find the output the Setup Workset Plate for sample {sample.name}")
                 # preprep
-                query = "select pr.* from process pr \
+                query = f"select pr.* from process pr \
                     inner join processiotracker piot on piot.processid=pr.processid \
                     inner join artifact_sample_map asm on piot.inputartifactid=asm.artifactid \
                     inner join sample sa on sa.processid=asm.processid \
-                    where sa.processid = {sapid} and pr.typeid in ({tid}) \
-                    order by pr.daterun;".format(
-                    sapid=sample.processid,
-                    tid=",".join(list(pc_cg.PREPREPSTART.keys())),
-                )
+                    where sa.processid = {sample.processid} and pr.typeid in ({PREPREPSTART_TYPEIDS}) \
+                    order by pr.daterun;"
                 try:
                     preprep = self.session.query(Process).from_statement(text(query)).first()
-                    self.obj["samples"][sample.name]["library_prep"][prepname]["pre_prep_start_date"] = preprep.daterun.strftime("%Y-%m-%d")
-                    if (
-                        "first_prep_start_date" not in self.obj["samples"][sample.name]
-                        or datetime.strptime(
-                            self.obj["samples"][sample.name]["first_prep_start_date"],
-                            "%Y-%m-%d",
-                        )
-                        > preprep.daterun
-                    ):
-                        self.obj["samples"][sample.name]["first_prep_start_date"] = preprep.daterun.strftime("%Y-%m-%d")
+                    pre_prep_start_date = preprep.daterun.strftime("%Y-%m-%d")
+                    prep_obj["pre_prep_start_date"] = pre_prep_start_date
+                    if "first_prep_start_date" not in sample_obj or sample_obj["first_prep_start_date"] > pre_prep_start_date:
+                        sample_obj["first_prep_start_date"] = pre_prep_start_date
                 except AttributeError:
                     self.log.info(f"Did not find a preprep for sample {sample.name}")
 
@@ -1068,8 +1046,9 @@ class ProjectSQL:
                     sample=sample.processid,
                 )
                 for seq in seqs:
-                    if "sample_run_metrics" not in self.obj["samples"][sample.name]["library_prep"][prepname]:
-                        self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"] = {}
+                    seq_udfs = seq.udf_dict
+                    if "sample_run_metrics" not in prep_obj:
+                        prep_obj["sample_run_metrics"] = {}
                     seqstarts = get_processes_in_history(
                         self.session,
                         seq.processid,
@@ -1100,45 +1079,35 @@ class ProjectSQL:
                                 lane = art.containerplacement.api_string.split(":")[1]
                             else:
                                 lane = art.containerplacement.api_string.split(":")[0]
-                            self.obj["sequencing_finished"] = seq.udf_dict.get("Finish Date")
+                            self.obj["sequencing_finished"] = seq_udfs.get("Finish Date")
                             try:
-                                run_id = seq.udf_dict["Run ID"]
-                                date = run_id.split("_")[0]
-                                fcid = run_id.split("_")[3]
-                                seqrun_barcode = self.obj["samples"][sample.name]["library_prep"][prepname]["barcode"]
+                                run_id_parts = seq_udfs["Run ID"].split("_")
+                                date = run_id_parts[0]
+                                fcid = run_id_parts[3]
+                                seqrun_barcode = prep_obj["barcode"]
                                 samp_run_met_id = "_".join([lane, date, fcid, seqrun_barcode])
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id] = {}
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_finish_date"] = seq.udf_dict.get("Finish Date")
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["seq_qc_flag"] = art.qc_flag
+                                run_metrics = prep_obj["sample_run_metrics"][samp_run_met_id] = {}
+                                run_metrics["sequencing_finish_date"] = seq_udfs.get("Finish Date")
+                                run_metrics["seq_qc_flag"] = art.qc_flag
                                 try:
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_start_date"] = seqstarts[0].daterun.strftime(
-                                        "%Y-%m-%d"
-                                    )
+                                    run_metrics["sequencing_start_date"] = seqstarts[0].daterun.strftime("%Y-%m-%d")
                                 except AttributeError:
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_start_date"] = seqstarts[0].createddate.strftime(
-                                        "%Y-%m-%d"
-                                    )
-                                self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sample_run_metrics_id"] = None  # Deprecated
+                                    run_metrics["sequencing_start_date"] = seqstarts[0].createddate.strftime("%Y-%m-%d")
+                                run_metrics["sample_run_metrics_id"] = None  # Deprecated
                                 try:
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["dillution_and_pooling_start_date"] = dilstarts[
-                                        0
-                                    ].daterun.strftime("%Y-%m-%d")
+                                    run_metrics["dillution_and_pooling_start_date"] = dilstarts[0].daterun.strftime("%Y-%m-%d")
                                 except AttributeError:
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["dillution_and_pooling_start_date"] = dilstarts[
-                                        0
-                                    ].createddate.strftime("%Y-%m-%d")
+                                    run_metrics["dillution_and_pooling_start_date"] = dilstarts[0].createddate.strftime("%Y-%m-%d")
                                 except IndexError:
                                     self.log.info(f"no dilution found for sequencing {seq.processid} of sample {sample.name}")
                                 # get the associated demultiplexing step
                                 query = f"select pr.* from process pr \
                                         inner join processiotracker piot on piot.processid=pr.processid \
-                                        where pr.typeid={list(pc_cg.DEMULTIPLEX.keys())[0]} and piot.inputartifactid={art.artifactid};"
+                                        where pr.typeid={next(iter(pc_cg.DEMULTIPLEX))} and piot.inputartifactid={art.artifactid};"
                                 try:
                                     dem = self.session.query(Process).from_statement(text(query)).one()
                                     try:
-                                        self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_run_QC_finished"] = dem.daterun.strftime(
-                                            "%Y-%m-%d"
-                                        )
+                                        run_metrics["sequencing_run_QC_finished"] = dem.daterun.strftime("%Y-%m-%d")
                                     except AttributeError:
                                         pass
 
@@ -1160,17 +1129,13 @@ class ProjectSQL:
                                         if art.qc_flag == "PASSED":
                                             cumulated_flag = "PASSED"
 
-                                    self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["dem_qc_flag"] = cumulated_flag
+                                    run_metrics["dem_qc_flag"] = cumulated_flag
 
                                 except NoResultFound:
                                     try:
-                                        self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_run_QC_finished"] = seq.daterun.strftime(
-                                            "%Y-%m-%d"
-                                        )
+                                        run_metrics["sequencing_run_QC_finished"] = seq.daterun.strftime("%Y-%m-%d")
                                     except AttributeError:
-                                        self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_run_QC_finished"] = seq.createddate.strftime(
-                                            "%Y-%m-%d"
-                                        )
+                                        run_metrics["sequencing_run_QC_finished"] = seq.createddate.strftime("%Y-%m-%d")
 
                                 self.log.info(f"no demultiplexing found for sample {sample.name}, sequencing {seq.processid}")
                             except:
@@ -1180,8 +1145,8 @@ class ProjectSQL:
                             run_name = art.udf_dict.get("ONT run name")
                             date = run_name.split("_")[0]
                             samp_run_met_id = run_name
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id] = {}
-                            self.obj["samples"][sample.name]["library_prep"][prepname]["sample_run_metrics"][samp_run_met_id]["sequencing_start_date"] = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+                            run_metrics = prep_obj["sample_run_metrics"][samp_run_met_id] = {}
+                            run_metrics["sequencing_start_date"] = f"{date[:4]}-{date[4:6]}-{date[6:]}"
 
     def extract_barcode(self, chain):
         barcode = ""
@@ -1202,10 +1167,15 @@ class ProjectSQL:
                 barcode = matches.group(1).replace("_", "-")
         matches = bcp.match(barcode)
         if not matches:
+            name = barcode
+            cached = self._barcode_cache.get(name)
+            if cached is not None:
+                return cached
             meta = self.session.query(ReagentType.meta_data).filter(ReagentType.name.like(f"%{barcode}%")).scalar()
             matches = bcp.search(meta)
             if matches:
                 barcode = matches.group(0).replace("_", "-")
+            self._barcode_cache[name] = barcode
         return barcode
 
     def set_status(self):
@@ -1,38 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
 from genologics_sql.utils import get_configuration, get_session
 from ibm_cloud_sdk_core.api_exception import ApiException
 
 from LIMS2DB.utils import setupLog
 
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
+def _lims_host():
+    return get_configuration()["url"]
 
-def diff_project_objects(pj_id, couch, logfile, oconf):
+
+def _make_project_builder(log, couch, oconf):
+    """Bind the ProjectSQL arguments that are constant for a whole run
+    (log, host, couch, oconf) once, so per-project calls only pass what
+    actually varies."""
     # Import is put here to defer circular imports
     from LIMS2DB.classes import ProjectSQL
 
-    log = setupLog(f"diff - {pj_id}", logfile)
+    return partial(ProjectSQL, log=log, host=_lims_host(), couch=couch, oconf=oconf)
 
-    def fetch_project(pj_id):
-        result = couch.post_view(
+
+@lru_cache(maxsize=65536)
+def _path(prefix, key):
+    # Prefixes and keys repeat heavily across projects in a batch, so the
+    # concatenated path (with its cached str hash) is shared between them
+    return prefix + key
+
+
+def _thread_session():
+    # SQLAlchemy sessions are not thread safe, so each worker thread
+    # keeps one open for the lifetime of the batch
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = get_session()
+    return session
+
+
+def _fetch_stripped_rows(couch, log, **view_args):
+    """Fetch (pj_id, doc) rows for diffing. Prefers the lims_followed_diff
+    view, whose map already emits the doc without _id/_rev, timestamps and
+    running notes, so those bytes never cross the wire. Falls back to
+    lims_followed with include_docs when the view is not deployed.
+    """
+    try:
+        rows = couch.post_view(
+            db="projects",
+            ddoc="projects",
+            view="lims_followed_diff",
+            **view_args,
+        ).get_result()["rows"]
+        return [(row["key"], row["value"]) for row in rows]
+    except ApiException:
+        log.info("lims_followed_diff view not available, falling back to lims_followed")
+        rows = couch.post_view(
             db="projects",
             ddoc="projects",
             view="lims_followed",
-            key=pj_id,
             include_docs=True,
+            **view_args,
         ).get_result()["rows"]
+        return [(row["key"], row["doc"]) for row in rows]
+
+
+def diff_project_objects(pj_id, couch, logfile, oconf, session=None):
+    log = setupLog(f"diff - {pj_id}", logfile)
+
+    def fetch_project(pj_id):
+        result = _fetch_stripped_rows(couch, log, key=pj_id)
         if not result:
             log.error(f"No project found in couch for {pj_id}")
             return None
-        return result[0]["doc"]
-
-    try:
-        old_project = fetch_project(pj_id)
-    except ApiException:
-        log.error("Connection issues after large project")
-        # Retry
-        old_project = fetch_project(pj_id)
+        return result[0][1]
+
+    for attempt in range(3):
+        try:
+            old_project = fetch_project(pj_id)
+            break
+        except ApiException:
+            if attempt == 2:
+                raise
+            log.error("Connection issues after large project")
+            # Back off before retrying so a loaded couch can catch its breath
+            time.sleep(0.1 * 4**attempt)
 
     if old_project is None:
         return None
 
+    return _diff_one(old_project, pj_id, couch, log, oconf, session)
+
+
+def diff_project_objects_batch(pj_ids, couch, logfile, oconf, max_workers=8):
+    """Diff several projects at once, fetching all their couch docs in a
+    single view request instead of one round-trip per project and diffing
+    them on a thread pool to overlap couch and SQL latency.
+    Returns a {pj_id: (diff, old_doc, new_doc)} dict, skipping projects
+    without a doc in couch.
+    """
+    log = setupLog("diff - batch", logfile)
+
+    old_projects = dict(_fetch_stripped_rows(couch, log, keys=list(pj_ids)))
+
+    build = _make_project_builder(log, couch, oconf)
+
+    def diff_one(pj_id):
+        old_project = old_projects.get(pj_id)
+        if old_project is None:
+            log.error(f"No project found in couch for {pj_id}")
+            return pj_id, None
+        return pj_id, _diff_one(old_project, pj_id, couch, log, oconf, _thread_session(), build)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return {pj_id: result for pj_id, result in executor.map(diff_one, pj_ids) if result is not None}
+
+
+def _diff_one(old_project, pj_id, couch, log, oconf, session=None, build=None):
+    # No-ops when the doc came from the stripped lims_followed_diff view,
+    # kept for the lims_followed fallback path
     old_project.pop("_id", None)
     old_project.pop("_rev", None)
     old_project.pop("modification_time", None)
@@ -40,36 +129,107 @@ def diff_project_objects(pj_id, couch, logfile, oconf):
     old_project["details"].pop("running_notes", None)
     old_project["details"].pop("snic_checked", None)
 
-    session = get_session()
-    host = get_configuration()["url"]
-    new_project = ProjectSQL(session, log, pj_id, host, couch, oconf)
+    if session is None:
+        session = get_session()
+    if build is None:
+        build = _make_project_builder(log, couch, oconf)
+    new_project = build(session, pid=pj_id)
 
     fediff = diff_objects(old_project, new_project.obj)
 
     return (fediff, old_project, new_project.obj)
 
 
-def diff_objects(o1, o2, parent=""):
-    diffs = {}
-
-    for key in o1:
-        if key in o2:
-            if isinstance(o1[key], dict):
-                more_diffs = diff_objects(o1[key], o2[key], f"{parent} {key}")
-                diffs.update(more_diffs)
-            else:
-                if o1[key] != o2[key]:
-                    diffs[f"{parent} {key}"] = [o1[key], o2[key]]
-
-        else:
-            if o1[key]:
-                diffs[f"key {parent} {key}"] = [o1[key], "missing"]
-
-    for key in o2:
-        if key not in o1 and o2[key]:
-            diffs[f"key {parent} {key}"] = ["missing", o2[key]]
-
-    return diffs
+def iter_diffs(o1, o2, parent=""):
+    """Yield (path, old_value, new_value) per difference, lazily.
+
+    Project docs are deeply nested, so walk them with an explicit stack
+    instead of recursing. Nothing is materialized, so callers that only
+    need "is there any diff?" can stop at the first yield.
+    """
+    # one C-level comparison settles the common "nothing changed" case
+    # before any Python-level walking starts
+    if o1 == o2:
+        return
+    stack = [(o1, o2, parent)]
+
+    while stack:
+        a, b, parent = stack.pop()
+        # Most keys compare equal, so only build the "<parent> <key>" string
+        # on the branches that actually record or descend into something.
+        prefix = parent + " "
+        # Key-view set arithmetic runs in C, replacing per-key membership tests
+        k1 = a.keys()
+        k2 = b.keys()
+        for key in k1 & k2:
+            av = a[key]
+            bv = b[key]
+            # Same object (interned values, shared sub-docs): nothing to diff
+            if av is bv:
+                continue
+            # Same-length lists (samples, libraries) are diffed per index so
+            # one changed element is not reported as two full-list payloads
+            if type(av) is list and type(bv) is list and len(av) == len(bv):
+                item_prefix = prefix + key
+                for i, (x, y) in enumerate(zip(av, bv)):
+                    if x is y:
+                        continue
+                    if type(x) is dict and type(y) is dict:
+                        stack.append((x, y, f"{item_prefix}[{i}]"))
+                    elif x != y:
+                        yield f"{item_prefix}[{i}]", x, y
+                continue
+            # exact type check: couch docs only ever hold plain dicts
+            if type(av) is dict and type(bv) is dict:
+                # Empty-on-one-side subtrees are common in details blobs:
+                # emit the other side directly instead of pushing a frame
+                if not av or not bv:
+                    child_key_prefix = "key " + prefix + key + " "
+                    for k, v in av.items():
+                        if v:
+                            yield _path(child_key_prefix, k), v, "missing"
+                    for k, v in bv.items():
+                        if v:
+                            yield _path(child_key_prefix, k), "missing", v
+                    continue
+                # Identical subtrees are the common case; one C-level dict
+                # compare is cheaper than walking them key by key
+                if av == bv:
+                    continue
+                stack.append((av, bv, prefix + key))
+            elif av != bv:
+                yield _path(prefix, key), av, bv
+
+        key_prefix = "key " + prefix
+        for key in k1 - k2:
+            av = a[key]
+            if av:
+                yield _path(key_prefix, key), av, "missing"
+
+        for key in k2 - k1:
+            bv = b[key]
+            if bv:
+                yield _path(key_prefix, key), "missing", bv
+
+
+def any_diff(o1, o2):
+    """True as soon as the first difference is found."""
+    for _ in iter_diffs(o1, o2):
+        return True
+    return False
+
+
+def diff_objects(o1, o2, parent="", sink=None):
+    # Callers that just stream diffs somewhere (log, DB insert) can pass a
+    # sink(path, [old, new]) callable and skip the intermediate dict
+    if sink is not None:
+        for path, old, new in iter_diffs(o1, o2, parent):
+            sink(path, [old, new])
+        return None
+    # dict(list) sizes the table once from len(list), instead of the
+    # comprehension's incremental resizes on diff-heavy projects
+    items = [(path, [old, new]) for path, old, new in iter_diffs(o1, o2, parent)]
+    return dict(items)
 
 
 if __name__ == "__main__":
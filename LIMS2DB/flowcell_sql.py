@@ -4,10 +4,31 @@ from sqlalchemy import text
 
 import LIMS2DB.objectsDB.process_categories as pc_cg
 
+# Sequencing steps whose per-lane stats sit on "Lane N" output artifacts
+LANE_OUTPUT_STEPS = frozenset(
+    [
+        "AUTOMATED - NovaSeq Run (NovaSeq 6000 v2.0)",
+        "AVITI Run v1.0",
+        "Illumina Sequencing (NextSeq) v1.0",
+        "NovaSeqXPlus Run v1.0",
+    ]
+)
+
+# Sequencing steps whose runs are documented in the x_flowcells db
+X_FLOWCELL_STEPS = frozenset(
+    [
+        "AUTOMATED - NovaSeq Run (NovaSeq 6000 v2.0)",
+        "Illumina Sequencing (NextSeq) v1.0",
+        "MiSeq Run (MiSeq) 4.0",
+        "NovaSeqXPlus Run v1.0",
+    ]
+)
+
 
 def create_lims_data_obj(session, pro):
     obj = {}
     obj["step_id"] = pro.luid
+    seq_step = pc_cg.SEQUENCING.get(str(pro.typeid), "")
 
     # which container is used in this step ?
     query = f"select distinct ct.* from container ct\
@@ -20,15 +41,11 @@ def create_lims_data_obj(session, pro):
     obj["container_name"] = cont.name
 
     # Fetch Run Type for MiSeq
-    if pc_cg.SEQUENCING.get(str(pro.typeid), "") in ["MiSeq Run (MiSeq) 4.0"]:
+    if seq_step == "MiSeq Run (MiSeq) 4.0":
         obj["run_type"] = pro.udf_dict["Run Type"]
 
-    if pc_cg.SEQUENCING.get(str(pro.typeid), "") in [
-        "AUTOMATED - NovaSeq Run (NovaSeq 6000 v2.0)",
-        "AVITI Run v1.0",
-        "Illumina Sequencing (NextSeq) v1.0",
-        "NovaSeqXPlus Run v1.0",
-    ]:
+    lane_outputs = seq_step in LANE_OUTPUT_STEPS
+    if lane_outputs:
         # NovaSeq flowcell have the individual stats as output artifact
         query = f"select art.* from artifact art \
                  inner join outputmapping omap on omap.outputartifactid=art.artifactid \
@@ -43,12 +60,7 @@ def create_lims_data_obj(session, pro):
     obj["run_summary"] = {}
     arts = session.query(Artifact).from_statement(text(query)).all()
     for art in arts:
-        if pc_cg.SEQUENCING.get(str(pro.typeid), "") in [
-            "AUTOMATED - NovaSeq Run (NovaSeq 6000 v2.0)",
-            "AVITI Run v1.0",
-            "Illumina Sequencing (NextSeq) v1.0",
-            "NovaSeqXPlus Run v1.0",
-        ]:
+        if lane_outputs:
             lane = art.name.replace("Lane ", "")
         else:
             lane = art.containerplacement.api_string.split(":")[0]
@@ -66,14 +78,10 @@ def get_sequencing_steps(session, interval="24 hours"):
 
 
 def upload_to_couch(couch, runid, lims_data, pro):
-    if pc_cg.SEQUENCING.get(str(pro.typeid), "") in [
-        "AUTOMATED - NovaSeq Run (NovaSeq 6000 v2.0)",
-        "Illumina Sequencing (NextSeq) v1.0",
-        "MiSeq Run (MiSeq) 4.0",
-        "NovaSeqXPlus Run v1.0",
-    ]:
+    seq_step = pc_cg.SEQUENCING.get(str(pro.typeid), "")
+    if seq_step in X_FLOWCELL_STEPS:
         dbname = "x_flowcells"
-    elif pc_cg.SEQUENCING.get(str(pro.typeid), "") in ["AVITI Run v1.0"]:
+    elif seq_step == "AVITI Run v1.0":
         dbname = "element_runs"
 
     doc = None
@@ -1,10 +1,11 @@
 import logging
 import multiprocessing as mp
 import queue as Queue
+from concurrent.futures import ThreadPoolExecutor
 
 import genologics_sql.tables as gt
-import yaml
 from genologics_sql.utils import get_session
+from ibmcloudant import cloudant_v1
 
 import LIMS2DB.classes as lclasses
 import LIMS2DB.utils as lutils
@@ -14,38 +15,45 @@ def masterProcessSQL(args, wslist, logger):
     worksetQueue = mp.JoinableQueue()
     logQueue = mp.Queue()
     childs = []
-    procs_nb = 1
-    if len(wslist) < args.procs:
-        procs_nb = len(wslist)
-    else:
-        procs_nb = args.procs
+    # parse the config once and hand the dict to the workers
+    conf = lutils.load_conf(args.conf)
+    # queue batches of worksets so the workers can collapse their couch
+    # lookups into one view request per batch; the caller hands us a set,
+    # so materialize it before slicing
+    wslist = list(wslist)
+    batches = [[ws.processid for ws in wslist[i : i + 50]] for i in range(0, len(wslist), 50)]
+    procs_nb = min(len(batches), args.procs)
 
     # spawn a pool of processes, and pass them queue instance
     for i in range(procs_nb):
-        p = mp.Process(target=processWSULSQL, args=(args, worksetQueue, logQueue))
+        p = mp.Process(target=processWSULSQL, args=(conf, worksetQueue, logQueue))
         p.start()
         childs.append(p)
     # populate queue with data
-    for ws in wslist:
-        worksetQueue.put(ws.processid)
+    for batch in batches:
+        worksetQueue.put(batch)
 
-    # wait on the queue until everything has been processed
-    notDone = True
-    while notDone:
+    # wait on the queue until everything has been processed; each child
+    # pushes a None sentinel when it exits, so block on the queue instead
+    # of spinning on is_alive checks
+    done_childs = 0
+    while done_childs < procs_nb:
         try:
-            log = logQueue.get(False)
-            logger.handle(log)
+            log = logQueue.get(timeout=1.0)
         except Queue.Empty:
+            # safety net in case a child died without sending its sentinel
             if not lutils.stillRunning(childs):
-                notDone = False
                 break
+        else:
+            if log is None:
+                done_childs += 1
+            else:
+                logger.handle(log)
 
 
-def processWSULSQL(args, queue, logqueue):
+def processWSULSQL(conf, queue, logqueue):
     work = True
     session = get_session()
-    with open(args.conf) as conf_file:
-        conf = yaml.load(conf_file, Loader=yaml.SafeLoader)
     couch = lutils.load_couch_server(conf)
     procName = mp.current_process().name
     proclog = logging.getLogger(procName)
@@ -54,50 +62,65 @@ def processWSULSQL(args, queue, logqueue):
     mft = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     mfh.setFormatter(mft)
     proclog.addHandler(mfh)
+    pool = ThreadPoolExecutor(max_workers=2)
 
     while work:
-        # grabs project from queue
+        # grabs a batch of worksets from queue
         try:
-            ws_id = queue.get(block=True, timeout=3)
-            proclog.info(f"Starting work on {ws_id}")
+            ws_ids = queue.get(block=True, timeout=3)
+            proclog.info(f"Starting work on {ws_ids}")
         except Queue.Empty:
             work = False
             proclog.info("exiting gracefully")
+            logqueue.put(None)
             break
         else:
-            step = session.query(gt.Process).filter(gt.Process.processid == int(ws_id)).one()
-            ws = lclasses.Workset_SQL(session, proclog, step)
-            doc = {}
-            result = couch.post_view(
-                db="worksets",
-                ddoc="worksets",
-                view="lims_id",
-                key=ws.obj["id"],
-                include_docs=True,
-            ).get_result()["rows"]
-            if result:
-                doc = result[0]["doc"]
-            if doc:
-                final_doc = lutils.merge(ws.obj, doc)
-            else:
-                final_doc = ws.obj
-            # clean possible name duplicates
-            result = couch.post_view(
-                db="worksets",
-                ddoc="worksets",
-                view="name",
-                key=ws.obj["name"],
-                include_docs=True,
-            ).get_result()["rows"]
-            if result:
-                doc = result[0]["doc"]
-                if doc["id"] != ws.obj["id"]:
-                    proclog.warning(f"Duplicate name {doc['name']} for worksets {doc['id']} and {final_doc['id']}")
-                    couch.delete_document(db="worksets", doc_id=doc["_id"], rev=doc["_rev"]).get_result()
-            # upload the document
-            couch.post_document(
-                db="worksets",
-                document=final_doc,
-            ).get_result()
-            proclog.info(f"updating {ws.obj['name']}")
+            worksets = []
+            for ws_id in ws_ids:
+                # primary-key get skips query compilation and hits the
+                # session identity map for already-loaded steps
+                step = session.get(gt.Process, int(ws_id))
+                worksets.append(lclasses.Workset_SQL(session, proclog, step))
+
+            def fetch_view(view, keys):
+                return couch.post_view(
+                    db="worksets",
+                    ddoc="worksets",
+                    view=view,
+                    keys=keys,
+                    include_docs=True,
+                ).get_result()["rows"]
+
+            # one view round-trip per batch instead of one per workset;
+            # the two views are independent, so overlap their latency
+            lims_id_rows = pool.submit(fetch_view, "lims_id", [ws.obj["id"] for ws in worksets])
+            name_rows = pool.submit(fetch_view, "name", [ws.obj["name"] for ws in worksets])
+            docs_by_lims_id = {row["key"]: row["doc"] for row in lims_id_rows.result()}
+            docs_by_name = {}
+            for row in name_rows.result():
+                docs_by_name.setdefault(row["key"], row["doc"])
+            changed_docs = []
+            for ws in worksets:
+                doc = docs_by_lims_id.get(ws.obj["id"])
+                if doc:
+                    final_doc = lutils.merge(ws.obj, doc)
+                else:
+                    final_doc = ws.obj
+                # clean possible name duplicates
+                dup = docs_by_name.get(ws.obj["name"])
+                if dup and dup["id"] != ws.obj["id"]:
+                    proclog.warning(f"Duplicate name {dup['name']} for worksets {dup['id']} and {final_doc['id']}")
+                    couch.delete_document(db="worksets", doc_id=dup["_id"], rev=dup["_rev"]).get_result()
+                # only upload documents the merge actually changed
+                if doc and final_doc == doc:
+                    proclog.info(f"no changes for {ws.obj['name']}")
+                else:
+                    changed_docs.append(final_doc)
+                    proclog.info(f"updating {ws.obj['name']}")
+            # one bulk write per batch instead of one POST per workset
+            if changed_docs:
+                couch.post_bulk_docs(
+                    db="worksets",
+                    bulk_docs=cloudant_v1.BulkDocs(docs=changed_docs),
+                ).get_result()
             queue.task_done()
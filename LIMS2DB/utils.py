@@ -1,26 +1,60 @@
 import logging
 import logging.handlers
+import os
 import smtplib
 from email.mime.text import MIMEText
+from functools import lru_cache
 
+import yaml
 from ibmcloudant import CouchDbSessionAuthenticator, cloudant_v1
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # LibYAML parses the config several times faster than the pure-Python
+    # loader; fall back when the bindings are not compiled in
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=4)
+def _load_conf_cached(path, mtime):
+    with open(path) as conf_file:
+        return yaml.load(conf_file, Loader=_YamlLoader)
+
+
+def load_conf(path):
+    """Parses a YAML config file, caching on (path, mtime) so repeated
+    loads within one process reuse the parsed dict.
+    :param str path: Path to the config file
+    :return: the parsed configuration dictionary
+    """
+    return _load_conf_cached(path, os.path.getmtime(path))
 
 
 # merges d2 in d1, keeps values from d1
 def merge(d1, d2):
     """Will merge dictionary d2 into dictionary d1.
     On the case of finding the same key, the one in d1 will be used.
+    Walks the nesting with an explicit stack, the workset and project
+    documents are deep enough that recursion overhead adds up.
     :param d1: Dictionary object
     :param s2: Dictionary object
     """
-    for key in d2:
-        if key in d1:
-            if isinstance(d1[key], dict) and isinstance(d2[key], dict):
-                merge(d1[key], d2[key])
-            elif d1[key] == d2[key]:
-                pass  # same leaf value
-        else:
-            d1[key] = d2[key]
+    stack = [(d1, d2)]
+    while stack:
+        a, b = stack.pop()
+        for key, value in b.items():
+            existing = a.get(key, _MISSING)
+            if existing is _MISSING:
+                a[key] = value
+            # exact type check: the merged docs only ever hold plain dicts
+            elif type(existing) is dict and type(value) is dict:
+                stack.append((existing, value))
     return d1
 
 
@@ -35,11 +69,7 @@ def setupLog(name, logfile):
 
 
 def formatStack(stack):
-    formatted_error = []
-    for trace in stack:
-        formatted_error.append(f"File {trace[0]}: line {trace[1]} in {trace[2]}\n{trace[3]}")
-
-    return "\n".join(formatted_error)
+    return "\n".join(f"File {trace[0]}: line {trace[1]} in {trace[2]}\n{trace[3]}" for trace in stack)
 
 
 def load_couch_server(conf):
@@ -53,25 +83,55 @@ def load_couch_server(conf):
     if not url.startswith("https://"):
         url = f"https://{url}"
     couchdb.set_service_url(url)
+    # keep the TLS connection alive across the many small view/document
+    # requests, and retry transparently on transient gateway errors
+    couchdb.get_http_client().mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+        ),
+    )
     return couchdb
 
 
-def send_mail(subject, content, receiver):
-    """Sends an email.
-    :param str subject: Subject for the email
-    :param str content: Content of the email
-    :param str receiver: Address to send the email
-    """
+def _build_mail(subject, content, receiver):
     if not receiver:
         raise SystemExit("No receiver was given to send mail")
+    if isinstance(receiver, str):
+        receiver = [receiver]
     msg = MIMEText(content, "html")
     msg["Subject"] = f"LIMS2DB notification - {subject}"
     msg["From"] = "LIMS2DB@scilifelab.se"
-    msg["To"] = receiver
+    msg["To"] = ", ".join(receiver)
+    return msg
+
 
-    s = smtplib.SMTP("localhost")
-    s.sendmail("LIMS2DB", [receiver], msg.as_string())
-    s.quit()
+def send_mail(subject, content, receiver):
+    """Sends an email.
+    :param str subject: Subject for the email
+    :param str content: Content of the email
+    :param receiver: Address or list of addresses to send the email
+    """
+    msg = _build_mail(subject, content, receiver)
+    # send_message streams the message without an as_string() copy, and the
+    # context manager quits the connection even when the send fails
+    with smtplib.SMTP("localhost") as s:
+        s.send_message(msg)
+
+
+def send_mail_many(messages):
+    """Sends a batch of emails over a single SMTP connection, so the
+    handshake is paid once instead of once per message.
+    :param messages: iterable of (subject, content, receiver) tuples
+    """
+    messages = list(messages)
+    if not messages:
+        return
+    with smtplib.SMTP("localhost") as s:
+        for subject, content, receiver in messages:
+            s.send_message(_build_mail(subject, content, receiver))
 
 
 def stillRunning(processList):
@@ -124,16 +184,17 @@ class QueueHandler(logging.Handler):
         the record to a dict or JSON string, or send a modified copy
         of the record while leaving the original intact.
         """
-        # The format operation gets traceback text into record.exc_text
-        # (if there's exception data), and also puts the message into
-        # record.message. We can then use this to replace the original
-        # msg + args, as these might be unpickleable. We also zap the
-        # exc_info attribute, as it's no longer needed and, if not None,
-        # will typically not be pickleable.
-        self.format(record)
-        record.msg = record.message
+        # Merge msg and args with getMessage() only - the receiving
+        # process formats the record again through its own handler, so
+        # running the full Formatter chain here (timestamp, name, level)
+        # would be wasted work. Traceback text still has to be rendered
+        # on this side into record.exc_text, as exc_info is typically
+        # not pickleable.
+        record.msg = record.getMessage()
         record.args = None
-        record.exc_info = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
         return record
 
     def emit(self, record):
@@ -2,56 +2,117 @@
 
 import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from genologics.config import BASEURI, PASSWORD, USERNAME
 from genologics.entities import Project
 from genologics.lims import Lims
+from ibmcloudant import cloudant_v1
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 
 import LIMS2DB.utils as lutils
 
+# number of couch documents fetched and written per bulk request
+BATCH_SIZE = 500
+
 
 def main(args):
     log = lutils.setupLog("bioinfologger", args.logfile)
     lims = Lims(BASEURI, USERNAME, PASSWORD)
+    # the close-date fetches below run 32 wide on one shared client, so
+    # give its session a matching connection pool and transparent retries
+    # instead of the requests default of 10 sockets
+    lims.request_session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+        ),
+    )
     with open(args.conf) as conf_file:
         conf = yaml.safe_load(conf_file)
     couch = lutils.load_couch_server(conf)
-    open_projects = couch.post_view(
-        db="bioinfo_analysis",
-        ddoc="latest_data",
-        view="sample_id_open",
-    ).get_result()["rows"]
 
-    for row in open_projects:
-        project_id = row["key"][0]
-        sample_id = row["key"][3]
-        close_date = None
+    def fetch_close_date(project_id):
         try:
-            close_date = Project(lims=lims, id=project_id).close_date
+            return Project(lims=lims, id=project_id).close_date
         except HTTPError as e:
             if "404: Project not found" in str(e):
                 log.error(f"Project {project_id} not found in LIMS")
+            return None
+
+    def close_rows(rows_to_close):
+        # fetch and write the affected docs in bulk instead of one GET
+        # and one PUT per sample row
+        if not rows_to_close:
+            return
+        row_by_id = {row["id"]: row for row in rows_to_close}
+        fetched = couch.post_all_docs(
+            db="bioinfo_analysis",
+            keys=list(row_by_id.keys()),
+            include_docs=True,
+        ).get_result()["rows"]
+        docs = []
+        for fetched_row in fetched:
+            row = row_by_id[fetched_row["key"]]
+            project_id = row["key"][0]
+            sample_id = row["key"][3]
+            doc = fetched_row.get("doc")
+            if not doc:
+                log.error(f"{fetched_row.get('error', 'missing doc')} in Project {project_id} Sample {sample_id} while accessing doc from statusdb")
+                continue
+            # already flagged on a previous run, don't bump _rev again
+            if doc.get("project_closed") is True:
                 continue
-        if close_date is not None:
-            try:
-                doc = couch.get_document(
-                    db="bioinfo_analysis",
-                    doc_id=row["id"],
-                ).get_result()
-            except Exception as e:
-                log.error(f"{e} in Project {project_id} Sample {sample_id} while accessing doc from statusdb")
             doc["project_closed"] = True
-            try:
-                couch.put_document(
-                    db="bioinfo_analysis",
-                    document=doc,
-                    doc_id=row["id"],
-                ).get_result()
+            docs.append(doc)
+        if not docs:
+            return
+        results = couch.post_bulk_docs(
+            db="bioinfo_analysis",
+            bulk_docs=cloudant_v1.BulkDocs(docs=docs),
+        ).get_result()
+        for result in results:
+            row = row_by_id[result["id"]]
+            project_id = row["key"][0]
+            sample_id = row["key"][3]
+            if result.get("error"):
+                log.error(f"{result['error']} in Project {project_id} Sample {sample_id} while saving to statusdb")
+            else:
                 log.info(f"Updated Project {project_id} Sample {sample_id}")
-            except Exception as e:
-                log.error(f"{e} in Project {project_id} Sample {sample_id} while saving to statusdb")
+
+    # page through the open-samples view instead of materializing every
+    # row in memory at once; each page is processed and discarded
+    close_dates = {}
+    view_args = {"limit": BATCH_SIZE}
+    while True:
+        page = couch.post_view(
+            db="bioinfo_analysis",
+            ddoc="latest_data",
+            view="sample_id_open",
+            **view_args,
+        ).get_result()["rows"]
+        if not page:
+            break
+        # many sample rows share a project, so ask LIMS once per project,
+        # and overlap the REST round-trips on a thread pool instead of
+        # paying them one by one
+        new_ids = [pid for pid in {row["key"][0] for row in page} if pid not in close_dates]
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            close_dates.update(zip(new_ids, executor.map(fetch_close_date, new_ids)))
+        close_rows([row for row in page if close_dates[row["key"][0]] is not None])
+        if len(page) < BATCH_SIZE:
+            break
+        view_args = {
+            "limit": BATCH_SIZE,
+            "start_key": page[-1]["key"],
+            "start_key_doc_id": page[-1]["id"],
+            "skip": 1,
+        }
 
 
 if __name__ == "__main__":
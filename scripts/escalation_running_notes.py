@@ -9,6 +9,7 @@ Should be run atleast daily as a cronjob
 import argparse
 import datetime
 import os
+from collections import defaultdict
 
 import genologics_sql.tables as tbls
 import markdown
@@ -18,7 +19,7 @@ from ibm_cloud_sdk_core.api_exception import ApiException
 from sqlalchemy import text
 from sqlalchemy.orm import aliased
 
-from LIMS2DB.utils import load_couch_server, send_mail
+from LIMS2DB.utils import load_couch_server, send_mail_many
 
 
 def main(args):
@@ -83,10 +84,9 @@ def main(args):
             del note["_rev"]
 
         if note_existing:
-            dict_note = dict(note_existing)
-            if "_rev" in dict_note.keys():
-                del dict_note["_rev"]
-            if not dict_note == note:
+            # compare only the fields this script generates, so _rev and
+            # anything genomics-status adds to the doc don't force a write
+            if {k: note_existing.get(k) for k in note} != note:
                 note_existing.update(note)
                 couch.put_document(db=db, doc_id=note_existing["_id"], document=note_existing).get_result()
                 updated = True
@@ -120,8 +120,10 @@ def main(args):
             "</div></div></blockquote></body></html>"
         )
 
-        send_mail(f"[LIMS] Running Note:P{project}, {res.name}", html, proj_coord.email)
+        # queued and sent over one SMTP connection at the end of the run
+        mails.append((f"[LIMS] Running Note:P{project}, {res.name}", html, proj_coord.email))
 
+    mails = []
     esc = aliased(tbls.EscalationEvent)
     sa = aliased(tbls.Sample)
     piot = aliased(tbls.ProcessIOTracker)
@@ -130,48 +132,74 @@ def main(args):
     # Assumed that it runs atleast once daily
     yesterday = datetime.date.today() - datetime.timedelta(days=1)
 
-    # get aggregate QC comments for running notes
+    # get aggregate QC comments for running notes; stream the rows in
+    # batches instead of materializing the whole cross-product at once
     escalations = (
         session.query(esc, sa)
         .join(piot, piot.processid == esc.processid)
         .join(asm, piot.inputartifactid == asm.columns["artifactid"])
         .join(sa, sa.processid == asm.columns["processid"])
         .filter(esc.lastmodifieddate > f"{yesterday}")
-        .all()
+        .execution_options(stream_results=True)
+        .yield_per(500)
     )
 
-    projects = {}
+    # single streaming pass: store the raw ids in each event and collect
+    # them, then resolve researchers and step names with one query each
+    principal_ids = set()
+    process_ids = set()
+    projects = defaultdict(dict)
     for escalation, sample in escalations:
         if not sample.projectid:
             continue
-        query = f"select ps.name from escalationevent esc, process pr, protocolstep ps where esc.processid=pr.processid and pr.protocolstepid=ps.stepid and esc.processid={escalation.processid};"
-        step_name = session.execute(text(query)).first()[0]
-        owner = get_researcher(escalation.ownerid)
-        reviewer = get_researcher(escalation.reviewerid)
-        if sample.projectid in projects.keys() and escalation.eventid in projects[sample.projectid]:
-            projects[sample.projectid][escalation.eventid]["samples"].append(sample.name)
-        else:
-            projects[sample.projectid] = {
-                escalation.eventid: {
-                    "samples": [sample.name],
-                    "step": step_name,
-                    "escalationcomment": escalation.escalationcomment,
-                    "escalationdate": escalation.escalationdate,
-                    "escalationprocessid": escalation.processid,
-                    "owner": owner,
-                    "reviewer": reviewer,
-                }
+        escevent = projects[sample.projectid].get(escalation.eventid)
+        if escevent is None:
+            # a project can hold several escalation events; accumulate per
+            # event instead of replacing the whole project entry
+            escevent = projects[sample.projectid][escalation.eventid] = {
+                "samples": [],
+                "step": escalation.processid,
+                "escalationcomment": escalation.escalationcomment,
+                "escalationdate": escalation.escalationdate,
+                "escalationprocessid": escalation.processid,
+                "owner": escalation.ownerid,
+                "reviewer": escalation.reviewerid,
             }
-
+            principal_ids.add(escalation.ownerid)
+            if escalation.reviewerid:
+                principal_ids.add(escalation.reviewerid)
+            process_ids.add(escalation.processid)
             if escalation.reviewdate:
-                if not escalation.reviewcomment:
-                    comment = "[No comments]"
-                else:
-                    comment = escalation.reviewcomment
-                projects[sample.projectid][escalation.eventid]["review"] = {
+                escevent["review"] = {
                     "reviewdate": escalation.reviewdate,
-                    "reviewcomment": comment,
+                    "reviewcomment": escalation.reviewcomment or "[No comments]",
                 }
+        escevent["samples"].append(sample.name)
+
+    # one researcher query for all owners and reviewers instead of two per row
+    researchers = {}
+    if principal_ids:
+        query = "select pr.principalid, rs.* from principals pr \
+                    inner join researcher rs on rs.researcherid=pr.researcherid \
+                    where pr.principalid in ({pids});".format(pids=",".join(str(pid) for pid in principal_ids))
+        for row in session.execute(text(query)):
+            researchers[row[0]] = row
+
+    # resolve every escalation's step name with one query instead of one
+    # round-trip per (escalation, sample) row
+    step_names = {}
+    if process_ids:
+        query = "select pr.processid, ps.name from process pr \
+                    inner join protocolstep ps on pr.protocolstepid=ps.stepid \
+                    where pr.processid in ({pids});".format(pids=",".join(str(pid) for pid in process_ids))
+        for row in session.execute(text(query)):
+            step_names[row[0]] = row[1]
+
+    for project_events in projects.values():
+        for escevent in project_events.values():
+            escevent["owner"] = researchers.get(escevent["owner"])
+            escevent["reviewer"] = researchers.get(escevent["reviewer"])
+            escevent["step"] = step_names.get(escevent["step"])
     for project in projects:
         for esceventid in projects[project]:
             escevent = projects[project][esceventid]
@@ -205,6 +233,8 @@ def main(args):
                 if update_note_db(revnote):
                     email_proj_coord(project, revnote, escevent["review"]["reviewdate"])
 
+    send_mail_many(mails)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sync the comments made in aggregate QC to project running notes")
@@ -11,9 +11,9 @@ import multiprocessing as mp
 import os
 import queue as Queue
 import sys
-import time
 import traceback
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
 from genologics.config import BASEURI, PASSWORD, USERNAME
@@ -23,7 +23,7 @@ from genologics_sql.tables import Project as DBProject
 from genologics_sql.utils import get_configuration, get_session
 
 from LIMS2DB.classes import ProjectSQL
-from LIMS2DB.utils import QueueHandler, formatStack, load_couch_server, stillRunning
+from LIMS2DB.utils import QueueHandler, formatStack, load_couch_server
 
 
 def main(options):
@@ -67,7 +67,7 @@ def main(options):
 
     else:
         projects = create_projects_list(options, lims_db, mainlims, mainlog)
-        masterProcess(options, projects, mainlims, mainlog, oconf)
+        masterProcess(options, projects, mainlims, mainlog, oconf, couch_conf)
         lims_db.commit()
         lims_db.close()
 
@@ -97,73 +97,48 @@ def create_projects_list(options, db_session, lims, log):
         return projects
 
 
-def processPSUL(options, queue, logqueue, oconf=None):
-    with open(options.conf) as conf_file:
-        couch_conf = yaml.load(conf_file, Loader=yaml.SafeLoader)
-    couch = load_couch_server(couch_conf)
-    db_session = get_session()
-    work = True
-    procName = mp.current_process().name
-    proclog = logging.getLogger(procName)
+# per-worker state opened once by _init_worker and reused for every
+# project the worker handles
+_worker = {}
+
+
+def _init_worker(options, logqueue, oconf=None, couch_conf=None):
+    if couch_conf is None:
+        with open(options.conf) as conf_file:
+            couch_conf = yaml.load(conf_file, Loader=yaml.SafeLoader)
+    proclog = logging.getLogger(mp.current_process().name)
     proclog.setLevel(level=logging.INFO)
     mfh = QueueHandler(logqueue)
     mft = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     mfh.setFormatter(mft)
     proclog.addHandler(mfh)
-    # Not completely sure what this does, maybe trying to load balance?
-    try:
-        time.sleep(int(procName[8:]))
-    except:
-        time.sleep(1)
-
-    while work:
-        # grabs project from queue
-        try:
-            projname = queue.get(block=True, timeout=3)
-            proclog.info(f"Starting work on {projname} ")
-            proclog.info(f"Approximately {queue.qsize()} projects left in queue")
-        except Queue.Empty:
-            work = False
-            proclog.info("exiting gracefully")
-            break
-        except NotImplementedError:
-            # qsize failed, no big deal
-            pass
-        else:
-            # locks the project : cannot be updated more than once.
-            lockfile = os.path.join(options.lockdir, projname)
-            if not os.path.exists(lockfile):
-                try:
-                    open(lockfile, "w").close()
-                except:
-                    proclog.error(f"cannot create lockfile {lockfile}")
-                try:
-                    pj_id = db_session.query(DBProject.luid).filter(DBProject.name == projname).scalar()
-                    host = get_configuration()["url"]
-                    P = ProjectSQL(db_session, proclog, pj_id, host, couch, oconf)
-                    P.save()
-                except:
-                    error = sys.exc_info()
-                    stack = traceback.extract_tb(error[2])
-                    proclog.error(f"{error[0]}:{error[1]}\n{formatStack(stack)}")
+    _worker.update(
+        couch=load_couch_server(couch_conf),
+        db_session=get_session(),
+        host=get_configuration()["url"],
+        log=proclog,
+        oconf=oconf,
+    )
 
-                try:
-                    os.remove(lockfile)
-                except:
-                    proclog.error(f"cannot remove lockfile {lockfile}")
-            else:
-                proclog.info(f"project {projname} is locked, skipping.")
 
-            # signals to queue job is done
-            queue.task_done()
-    db_session.commit()
-    db_session.close()
+def run_one_project(projname):
+    proclog = _worker["log"]
+    db_session = _worker["db_session"]
+    proclog.info(f"Starting work on {projname} ")
+    try:
+        pj_id = db_session.query(DBProject.luid).filter(DBProject.name == projname).scalar()
+        P = ProjectSQL(db_session, proclog, pj_id, _worker["host"], _worker["couch"], _worker["oconf"])
+        P.save()
+    except:
+        error = sys.exc_info()
+        stack = traceback.extract_tb(error[2])
+        proclog.error(f"{error[0]}:{error[1]}\n{formatStack(stack)}")
 
 
-def masterProcess(options, projectList, mainlims, logger, oconf=None):
-    projectsQueue = mp.JoinableQueue()
-    logQueue = mp.Queue()
-    childs = []
+def masterProcess(options, projectList, mainlims, logger, oconf=None, couch_conf=None):
+    # a manager queue is picklable into pool workers, a plain mp.Queue
+    # is not
+    logQueue = mp.Manager().Queue()
     # Initial step : order projects by sample number:
     logger.info("ordering the project list")
     orderedprojectlist = sorted(
@@ -172,25 +147,34 @@ def masterProcess(options, projectList, mainlims, logger, oconf=None):
         reverse=True,
     )
     logger.info("done ordering the project list")
-    # spawn a pool of processes, and pass them queue instance
-    for i in range(options.processes):
-        p = mp.Process(target=processPSUL, args=(options, projectsQueue, logQueue, oconf))
-        p.start()
-        childs.append(p)
-    # populate queue with data
-    for proj in orderedprojectlist:
-        projectsQueue.put(proj.name)
-
-    # wait on the queue until everything has been processed
-    notDone = True
-    while notDone:
+    # ProjectSQL builds large nested dicts and CPython rarely hands the
+    # freed arenas back to the OS, so recycle each worker after 50
+    # projects to keep RSS bounded (spawn is required for recycling);
+    # the keyword only exists on python >= 3.11, run long-lived workers
+    # on older interpreters
+    pool_kwargs = {}
+    if sys.version_info >= (3, 11):
+        pool_kwargs = {"mp_context": mp.get_context("spawn"), "max_tasks_per_child": 50}
+    # the pool schedules one project per task and reaps its own workers,
+    # so there is no queue feeding, no exit sentinel and no is_alive poll
+    with ProcessPoolExecutor(
+        max_workers=options.processes,
+        initializer=_init_worker,
+        initargs=(options, logQueue, oconf, couch_conf),
+        **pool_kwargs,
+    ) as executor:
+        futures = [executor.submit(run_one_project, proj.name) for proj in orderedprojectlist]
+        while not all(future.done() for future in futures):
+            try:
+                logger.handle(logQueue.get(timeout=0.5))
+            except Queue.Empty:
+                pass
+    # workers are gone; forward whatever they logged on the way out
+    while True:
         try:
-            log = logQueue.get(False)
-            logger.handle(log)
+            logger.handle(logQueue.get_nowait())
         except Queue.Empty:
-            if not stillRunning(childs):
-                notDone = False
-                break
+            break
 
 
 if __name__ == "__main__":
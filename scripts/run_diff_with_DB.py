@@ -45,18 +45,14 @@ def main(args):
                 closed_ids.append(row["key"][1])
         nb = int(len(closed_ids) / 10)
         picked_ids = random.sample(closed_ids, nb)
-        for one_id in picked_ids:
-            diffs[one_id] = df.diff_project_objects(one_id, couch, args.log, oconf)
+        diffs = df.diff_project_objects_batch(picked_ids, couch, args.log, oconf)
     else:
         view = couch.post_view(
             db="projects",
             ddoc="project",
             view="project_id",
         ).get_result()["rows"]
-        for row in view:
-            proj_diff = df.diff_project_objects(row["key"], couch, args.log, oconf)
-            if proj_diff is not None:
-                diffs[row["key"]] = proj_diff
+        diffs = df.diff_project_objects_batch([row["key"] for row in view], couch, args.log, oconf)
 
     write_results_to_file(diffs, args)
 
@@ -6,7 +6,9 @@ from genologics.config import BASEURI, PASSWORD, USERNAME
 from genologics.entities import Project
 from genologics.lims import Lims
 from genologics_sql.queries import get_last_modified_projectids
+from genologics_sql.tables import Project as DBProject
 from genologics_sql.utils import get_session
+from sqlalchemy import text
 
 from LIMS2DB.utils import load_couch_server
 
@@ -26,12 +28,23 @@ def main(args):
         db_key = " ".join(x if x else "" for x in row["key"]).strip()
         min_yields[db_key] = row["value"]
 
+    # count the non-aborted samples of all projects with one server-side
+    # aggregation instead of downloading every sample payload over REST
+    projectid_by_luid = dict(lims_db.query(DBProject.luid, DBProject.projectid).filter(DBProject.luid.in_(project_ids)).all())
+    samples_counts = {}
+    if projectid_by_luid:
+        query = "select sa.projectid, count(*) from sample sa \
+                where sa.projectid in ({pids}) and not exists ( \
+                    select 1 from entity_udf_view udf \
+                    where udf.attachtoid = sa.processid \
+                    and udf.udfname = 'Status (manual)' \
+                    and udf.udfvalue = 'Aborted') \
+                group by sa.projectid;".format(pids=",".join(str(pid) for pid in projectid_by_luid.values()))
+        for projectid, count in lims_db.execute(text(query)):
+            samples_counts[projectid] = count
+
     for project in [Project(lims, id=x) for x in project_ids]:
-        samples_count = 0
-        samples = lims.get_samples(projectname=project.name)
-        for sample in samples:
-            if not ("Status (manual)" in sample.udf and sample.udf["Status (manual)"] == "Aborted"):
-                samples_count += 1
+        samples_count = samples_counts.get(projectid_by_luid.get(project.id), 0)
         try:
             lanes_ordered = project.udf["Sequence units ordered (lanes)"]
             key = project.udf["Sequencing platform"]
@@ -1,10 +1,10 @@
 import argparse
 import os
 
-import yaml
-from genologics_sql.queries import get_last_modified_processes, get_processes_in_history
+from genologics_sql.queries import get_last_modified_processes
 from genologics_sql.tables import Process
 from genologics_sql.utils import get_session
+from sqlalchemy import text
 
 import LIMS2DB.classes as lclasses
 import LIMS2DB.objectsDB.process_categories as pc_cg
@@ -12,14 +12,31 @@ import LIMS2DB.parallel as lpar
 import LIMS2DB.utils as lutils
 
 
+def get_processes_in_history_bulk(session, process_ids, typeids):
+    """One-round-trip version of genologics_sql's get_processes_in_history
+    for a whole batch of processes. The caller unions the histories anyway,
+    so this returns a flat list of distinct matching processes.
+    """
+    if not process_ids:
+        return []
+    query = "select distinct pro.* from process pro \
+            inner join processiotracker piot on piot.processid=pro.processid \
+            inner join artifact_ancestor_map aam on aam.ancestorartifactid=piot.inputartifactid \
+            inner join processiotracker piot2 on piot2.inputartifactid=aam.artifactid \
+            where piot2.processid in ({pids}) and pro.typeid in ({tids});".format(
+        pids=",".join(str(pid) for pid in process_ids),
+        tids=",".join(typeids),
+    )
+    return session.query(Process).from_statement(text(query)).all()
+
+
 def main(args):
     log = lutils.setupLog("worksetlogger", args.logfile)
     session = get_session()
     if args.ws:
         step = session.query(Process).filter_by(luid=args.ws).one()
         ws = lclasses.Workset_SQL(session, log, step)
-        with open(args.conf) as conf_file:
-            conf = yaml.load(conf_file, Loader=yaml.SafeLoader)
+        conf = lutils.load_conf(args.conf)
         couch = lutils.load_couch_server(conf)
         doc = {}
         result = couch.post_view(db="worksets", ddoc="worksets", view="lims_id", key=ws.obj["id"], include_docs=True).get_result()["rows"]
@@ -28,23 +45,35 @@ def main(args):
 
         final_doc = lutils.merge(ws.obj, doc)
 
-        couch.post_document(
-            db="worksets",
-            document=final_doc,
-        ).get_result()
+        # like the batched path, don't bump _rev when the merge changed nothing
+        if doc and final_doc == doc:
+            log.info(f"workset {ws.obj['id']} is up to date, not saving")
+        else:
+            couch.post_document(
+                db="worksets",
+                document=final_doc,
+            ).get_result()
 
     elif args.recent:
+        workset_keys = list(pc_cg.WORKSET.keys())
+        # typeid comes back from postgres as an int; compare against ints so
+        # the row loop skips a str() call per process
+        workset_typeids = frozenset(int(tid) for tid in workset_keys)
         recent_processes = get_last_modified_processes(
             session,
-            list(pc_cg.AGRLIBVAL.keys()) + list(pc_cg.SEQUENCING.keys()) + list(pc_cg.WORKSET.keys()),
+            list(pc_cg.AGRLIBVAL.keys()) + list(pc_cg.SEQUENCING.keys()) + workset_keys,
             args.interval,
         )
         processes_to_update = set()
+        non_workset_ids = []
         for p in recent_processes:
-            if str(p.typeid) in list(pc_cg.WORKSET.keys()) and p.daterun:  # will only catch finished setup workset plate
+            if p.typeid in workset_typeids and p.daterun:  # will only catch finished setup workset plate
                 processes_to_update.add(p)
             else:
-                processes_to_update.update(get_processes_in_history(session, p.processid, list(pc_cg.WORKSET.keys())))
+                non_workset_ids.append(p.processid)
+        # recent processes often share ancestry, so resolve every history
+        # with one query instead of one round-trip per process
+        processes_to_update.update(get_processes_in_history_bulk(session, non_workset_ids, workset_keys))
 
         log.info(f"the following processes will be updated : {processes_to_update}")
         lpar.masterProcessSQL(args, processes_to_update, log)